@@ -1,39 +1,46 @@
+import io
 import streamlit as st
 from pathlib import Path
 from main import (
     leer_texto_pdf,
     extraer_datos_citacion,
-    generar_preguntas_gemini,
+    generar_preguntas_ia_stream,
+    combinar_preguntas,
     generar_acta,
 )
 
 st.set_page_config(page_title="Generador de Actas RRHH", page_icon="📄", layout="wide")
 st.title("📋 RRHH - Generador de Actas de Descargo AGP")
 
+
+@st.cache_data(show_spinner=False)
+def _parse_pdf(pdf_bytes: bytes) -> dict:
+    """Lee y extrae los datos del PDF una sola vez por contenido (sobrevive a los reruns)."""
+    texto = leer_texto_pdf(io.BytesIO(pdf_bytes))
+    datos = extraer_datos_citacion(texto) if len(texto) >= 50 else None
+    return {"texto": texto, "datos": datos}
+
+
 # --- Subir PDF ---
 st.header("1️⃣ Cargar Citación")
 archivo_pdf = st.file_uploader("Sube el documento PDF de la citación", type=["pdf"])
 
 if archivo_pdf:
-    # Guardar temporalmente el PDF subido
-    temp_path = Path("temp_citacion.pdf")
-    with open(temp_path, "wb") as f:
-        f.write(archivo_pdf.read())
+    # Leer y extraer el PDF subido directamente desde memoria (cacheado por contenido)
+    resultado = _parse_pdf(archivo_pdf.getvalue())
 
     st.success("✅ Documento cargado correctamente.")
-    texto = leer_texto_pdf(temp_path)
 
-    if len(texto) < 50:
+    if resultado["datos"] is None:
         st.error("❌ No se pudo leer texto del PDF (puede estar escaneado como imagen).")
         st.stop()
 
-    # --- Extraer datos ---
-    datos = extraer_datos_citacion(texto)
+    datos = resultado["datos"]
 
     st.header("2️⃣ Datos extraídos de la citación")
     col1, col2 = st.columns(2)
     with col1:
-        st.text_input("Nombre del colaborador", datos["nombre"], key="nombre")
+        st.text_input("Nombre del colaborador", datos["nombre"].title(), key="nombre")
         st.text_input("Fecha de citación", datos["fecha_citacion"], key="fecha_citacion")
     with col2:
         st.text_input("Fecha del hecho", datos["fecha_hecho"], key="fecha_hecho")
@@ -44,8 +51,17 @@ if archivo_pdf:
     # --- Generar preguntas con IA ---
     st.header("3️⃣ Preguntas generadas automáticamente")
     if st.button("Generar preguntas con IA"):
+        preguntas_ia = []
+
+        def _preguntas_ia_en_vivo():
+            # Muestra cada pregunta apenas llega y la guarda para ordenarla después
+            for pregunta in generar_preguntas_ia_stream(datos):
+                preguntas_ia.append(pregunta)
+                yield f"- {pregunta}\n"
+
         with st.spinner("Generando preguntas con Gemini..."):
-            preguntas = generar_preguntas_gemini(datos)
+            st.write_stream(_preguntas_ia_en_vivo())
+        preguntas = combinar_preguntas(datos, preguntas_ia)
 
         st.session_state["preguntas"] = preguntas
         st.success("✅ Preguntas generadas exitosamente.")
@@ -63,7 +79,7 @@ if archivo_pdf:
         st.header("4️⃣ Generar acta final")
         if st.button("Generar Acta Word"):
             with st.spinner("Creando documento Word..."):
-                salida = generar_acta(datos, st.session_state["preguntas"])
+                salida = generar_acta(datos, st.session_state["preguntas"]).result()
             st.success(f"✅ Acta generada correctamente: {salida}")
             with open(salida, "rb") as f:
                 st.download_button("⬇️ Descargar Acta Word", f, file_name=Path(salida).name)
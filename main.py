@@ -1,12 +1,24 @@
+import copy
+import hashlib
+import io
 import os
 import re
-import pdfplumber
+import tempfile
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import diskcache
+import pymupdf
+import requests
 from pathlib import Path
+from typing import IO, Union
 from datetime import datetime
+from functools import lru_cache
 from docxtpl import DocxTemplate
 from dotenv import load_dotenv
 from docxtpl import RichText
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
 
 
@@ -16,31 +28,124 @@ CITACIONES_DIR = BASE_DIR / "Citaciones"
 ACTAS_DIR = BASE_DIR / "ActasGeneradas"
 PLANTILLA_ACTA = BASE_DIR / "plantillas_acta2.docx"
 ENV_PATH = BASE_DIR / ".env"
+GEMINI_CACHE_DIR = BASE_DIR / ".gemini_cache"
 
 # === Cargar clave API ===
 load_dotenv(ENV_PATH)
 API_KEY = os.getenv("GEMINI_API_KEY")
 if API_KEY:
-    genai.configure(api_key=API_KEY)
+    # REST reutiliza una sola sesión HTTP entre llamadas (sin un handshake TLS por acta)
+    genai.configure(api_key=API_KEY, transport="rest")
 else:
     print("⚠️ GEMINI_API_KEY no encontrada en .env. Se usarán preguntas genéricas.")
 
+# === RECURSOS REUTILIZABLES ===
+@lru_cache(maxsize=1)
+def _modelo():
+    """Instancia única del modelo de Gemini, reutilizada entre llamadas."""
+    return genai.GenerativeModel("gemini-2.5-flash")
+
+
+@lru_cache(maxsize=1)
+def _plantilla() -> DocxTemplate:
+    """Plantilla Word leída a memoria, descomprimida y parseada una sola vez (en el primer uso)."""
+    plantilla = DocxTemplate(io.BytesIO(PLANTILLA_ACTA.read_bytes()))
+    plantilla.init_docx()
+    return plantilla
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    # Con transport="rest" un 429 llega como TooManyRequests (ResourceExhausted es subclase) y los
+    # cortes de red como excepciones de requests, no como TimeoutError
+    retry=retry_if_exception_type(
+        (
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.GatewayTimeout,
+            requests.exceptions.Timeout,
+            requests.exceptions.ConnectionError,
+        )
+    ),
+    reraise=True,
+)
+def _generar_contenido(prompt: str):
+    """Abre la respuesta en streaming de Gemini, reintentando ante errores transitorios (429/503/504/red)."""
+    return _modelo().generate_content(prompt, stream=True)
+
+
+# Respuestas de Gemini ya procesadas, persistidas entre ejecuciones
+_CACHE_GEMINI = diskcache.Cache(str(GEMINI_CACHE_DIR))
+
+
+def _clave_cache_gemini(parsed: dict, max_ai: int) -> str:
+    """Hash del contexto que determina la respuesta de Gemini."""
+    contenido = "\x1f".join(
+        (parsed["tipo_falta"], parsed["detalle"], parsed["articulos"], str(max_ai))
+    )
+    return hashlib.blake2b(contenido.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# === PATRONES (compilados una sola vez al importar el módulo) ===
+_RE_ESPACIOS = re.compile(r"\s+")
+# Bloque de artículos: entre la frase inicial ('...Falta Grave...empresa:') y la final ('Se le informa...').
+# El tramo 'Falta Grave ... empresa' va acotado para que un PDF sin 'empresa' no dispare backtracking.
+_RE_BLOQUE_ARTICULOS = re.compile(
+    r"Las\s+conductas\s+que\s+se\s+le\s+imputan\s+se\s+han\s+calificado\s+provisionalmente\s+como\s+Falta\s+Grave[\s\S]{0,4000}?empresa[:]*"
+    r"(?P<cuerpo>.*?)"
+    r"Se\s+le\s+informa\s+al\s+trabajador\s+sobre\s+la\s+oportunidad\s+de\s+presentar",
+    re.IGNORECASE | re.DOTALL,
+)
+# Espacios dobles (se colapsan) o inicio de un Artículo (se antepone un salto de línea)
+_RE_LIMPIEZA_ARTICULOS = re.compile(r"\s{2,}|(Artículo)\s+(\d+)", re.IGNORECASE)
+_RE_NOMBRE = re.compile(r"Señor\s*\(a\)\s*[:\-]?\s*([A-ZÁÉÍÓÚÑ\s]+)")
+_RE_CEDULA = re.compile(
+    r"Señor\s*\(a\)\s*[:\-]?\s*[A-ZÁÉÍÓÚÑ\s]+\s+([0-9]{5,15})",
+    re.IGNORECASE,
+)
+# Admite "de 2025" o "2025", con o sin puntos en am/pm
+_RE_FECHA_CITACION = re.compile(
+    r"el\s+d[ií]a\s+([\d]{1,2}\s+de\s+[a-zA-ZñÑ]+\s+del?\s+\d{4}\s+a\s+las\s+[0-9:.\s]+(?:a\.?m\.?|p\.?m\.?))",
+    re.IGNORECASE,
+)
+_RE_FECHA_HECHO = re.compile(r"Cometidos\s+el\s+d[ií]a[:\s]+([0-9\-\/]+)", re.IGNORECASE)
+_RE_DETALLE = re.compile(
+    r"compañ[ií]a[:\-]?\s*(.+?)Cometidos\s+el\s+d[ií]a",
+    re.IGNORECASE | re.DOTALL,
+)
+# Detiene al encontrar punto, coma o frase siguiente
+_RE_TIPO_FALTA = re.compile(
+    r"Tipo\s+de\s+Falta\s*[:\-]?\s*([A-Za-zÁÉÍÓÚÑ\s]+?)(?:\.|,|las\s+conductas|según|$)",
+    re.IGNORECASE,
+)
+# Una línea de lista ("1. ...", "2) ...", "- ...", "• ...") con la viñeta o numeración ya quitada
+_RE_NUMLINE = re.compile(r"^\s*(?:\d+[.)]|[-•*])?\s*(.+?)\s*$", re.MULTILINE)
+_RE_PREGUNTA = re.compile(r"¿[^?]+\?")
+
 
 # === LECTURA DE PDF ===
-def leer_texto_pdf(path: Path) -> str:
-    """Extrae el texto plano de todas las páginas del PDF."""
-    texto = ""
+def leer_texto_pdf(path: Union[Path, IO[bytes]]) -> str:
+    """Extrae el texto plano de todas las páginas del PDF (ruta o archivo en memoria)."""
     try:
-        with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                texto += page.extract_text() + "\n"
-        texto = re.sub(r"\s+", " ", texto)
+        if isinstance(path, (str, Path)):
+            pdf = pymupdf.open(path)
+        else:
+            pdf = pymupdf.open(stream=path.read(), filetype="pdf")
+        with pdf:
+            texto = "\n".join(page.get_text("text", sort=True) for page in pdf)
+        texto = _RE_ESPACIOS.sub(" ", texto)
         return texto.strip()
     except Exception as e:
-        print(f"❌ Error leyendo PDF {path.name}: {e}")
+        print(f"❌ Error leyendo PDF {getattr(path, 'name', 'en memoria')}: {e}")
         return ""
 
 # === EXTRACCIÓN COMPLETA DE ARTÍCULOS ===
+def _limpiar_articulos(m: re.Match) -> str:
+    """Reemplazo de _RE_LIMPIEZA_ARTICULOS: salto antes de cada Artículo, un solo espacio en el resto."""
+    return f"\n{m.group(1)} {m.group(2)}" if m.group(1) else " "
+
+
 def extraer_articulos_completos(texto: str) -> str:
     """
     Extrae el bloque de artículos tal como aparece en la citación.
@@ -49,27 +154,13 @@ def extraer_articulos_completos(texto: str) -> str:
     # Normalizar saltos de línea y espacios
     texto = texto.replace("\r", " ").replace("\n", " ").strip()
 
-    # Definir delimitadores
-    inicio_patron = re.search(
-        r"Las\s+conductas\s+que\s+se\s+le\s+imputan\s+se\s+han\s+calificado\s+provisionalmente\s+como\s+Falta\s+Grave[\s\S]*?empresa[:]*",
-        texto,
-        flags=re.IGNORECASE
-    )
-    fin_patron = re.search(
-        r"Se\s+le\s+informa\s+al\s+trabajador\s+sobre\s+la\s+oportunidad\s+de\s+presentar",
-        texto,
-        flags=re.IGNORECASE
-    )
-
-    if not inicio_patron or not fin_patron:
+    # Extraer el bloque intermedio entre ambos delimitadores
+    bloque = _RE_BLOQUE_ARTICULOS.search(texto)
+    if not bloque:
         return "No se encontraron los artículos en la citación."
 
-    # Extraer el bloque intermedio
-    articulos_texto = texto[inicio_patron.end():fin_patron.start()].strip()
-
-    # Limpieza básica
-    articulos_texto = re.sub(r"\s{2,}", " ", articulos_texto)  # quita espacios dobles
-    articulos_texto = re.sub(r"(Artículo\s+\d+)", r"\n\1", articulos_texto, flags=re.IGNORECASE)  # salto antes de cada Artículo
+    # Limpieza básica en una sola pasada: quita espacios dobles y pone un salto antes de cada Artículo
+    articulos_texto = _RE_LIMPIEZA_ARTICULOS.sub(_limpiar_articulos, bloque.group("cuerpo").strip())
     articulos_texto = articulos_texto.strip()
 
     return articulos_texto if len(articulos_texto) > 20 else "No se encontraron artículos válidos."
@@ -83,46 +174,29 @@ def extraer_datos_citacion(texto: str) -> dict:
     t = texto.replace("\r", " ").replace("\n", " ").strip()
 
     # === Nombre del colaborador ===
-    m = re.search(r"Señor\s*\(a\)\s*[:\-]?\s*([A-ZÁÉÍÓÚÑ\s]+)", t)
-    nombre = m.group(1).strip().title() if m else "No encontrado"
+    m = _RE_NOMBRE.search(t)
+    nombre = m.group(1).strip() if m else "No encontrado"
 
     # === Cédula (línea justo debajo del nombre) ===
     # Buscamos el nombre y tomamos hasta 40 caracteres después para capturar número
-    m = re.search(
-        r"Señor\s*\(a\)\s*[:\-]?\s*[A-ZÁÉÍÓÚÑ\s]+\s+([0-9]{5,15})",
-        t,
-        re.IGNORECASE,
-    )
+    m = _RE_CEDULA.search(t)
     cedula = m.group(1).strip() if m else "No encontrada"
 
     # === Fecha de la citación ===
-    # Admite "de 2025" o "2025", con o sin puntos en am/pm
-    m = re.search(
-    r"el\s+d[ií]a\s+([\d]{1,2}\s+de\s+[a-zA-ZñÑ]+\s+del?\s+\d{4}\s+a\s+las\s+[0-9:.\s]+(?:a\.?m\.?|p\.?m\.?))",
-    t,
-    re.IGNORECASE
-    )
+    m = _RE_FECHA_CITACION.search(t)
     fecha_citacion = m.group(1).strip() if m else "No encontrada"
 
     # === Fecha del hecho ===
-    m = re.search(r"Cometidos\s+el\s+d[ií]a[:\s]+([0-9\-\/]+)", t, re.IGNORECASE)
+    m = _RE_FECHA_HECHO.search(t)
     fecha_hecho = m.group(1).strip() if m else "No encontrada"
 
     # === Detalle del caso ===
-    m = re.search(
-        r"compañ[ií]a[:\-]?\s*(.+?)Cometidos\s+el\s+d[ií]a",
-        t,
-        re.IGNORECASE | re.DOTALL,
-    )
+    m = _RE_DETALLE.search(t)
     detalle = m.group(1).strip() if m else "No se encontró detalle"
 
     # === Tipo de Falta (detiene al encontrar punto, coma o frase siguiente) ===
-    m = re.search(
-        r"Tipo\s+de\s+Falta\s*[:\-]?\s*([A-Za-zÁÉÍÓÚÑ\s]+?)(?:\.|,|las\s+conductas|según|$)",
-        t,
-        re.IGNORECASE,
-    )
-    tipo_falta = m.group(1).strip().title() if m else "No encontrada"
+    m = _RE_TIPO_FALTA.search(t)
+    tipo_falta = m.group(1).strip() if m else "No encontrada"
 
     # === Artículos citados ===
     articulos = extraer_articulos_completos(texto)
@@ -138,84 +212,103 @@ def extraer_datos_citacion(texto: str) -> dict:
     }
 
 
-# === PREGUNTAS BASE POR TIPO DE  ===
+# === PREGUNTAS BASE POR TIPO DE FALTA ===
+_PREGUNTAS_PROCEDIMIENTO = (
+    "¿Cuánto tiempo lleva en la compañía y en el cargo?",
+    "¿Sabe usted que debe actuar con diligencia y cuidado para asegurar la calidad y eficiencia en su trabajo, según el artículo 54 del Reglamento Interno?",
+    "¿Conoce el Reglamento Interno de Trabajo?",
+    "¿Considera que cometió una falta?",
+    "¿Quiere agregar algo más a la presente diligencia?",
+)
+
+_PREGUNTAS_AUSENCIA = (
+    "¿Cuánto tiempo lleva en la compañía y en el cargo?",
+    "¿Por qué no asistió a trabajar los días mencionados?",
+    "¿Tiene algún soporte que justifique sus ausencias?",
+    "¿Sabe usted que se les prohíbe a los trabajadores faltar al turno o jornada de trabajo sin justa causa de impedimento o sin permiso de la Empresa?",
+    "¿Sabe usted que es una falta grave la falta parcial o total en la jornada de la mañana o de la tarde para el personal administrativo, o en el turno correspondiente para el personal operativo, sin excusa suficiente?",
+    "¿Conoce el Reglamento Interno de Trabajo?",
+    "¿Considera que cometió una falta?",
+    "¿Quiere agregar algo más a la presente?",
+)
+
+_PREGUNTAS_EPP = (
+    "¿Cuánto tiempo lleva en la compañía y en el cargo?",
+    "¿Usted se encontraba haciendo caso omiso del uso de EPPS?",
+    "¿Por qué motivo no estaba usando los EPPS?",
+    "¿Sabe usted que es prohibido “Hacer caso omiso en el uso de los elementos de protección personal y ejecutar cualquier acto inseguro que ponga en peligro su seguridad”?",
+    "¿Usted es consciente que pudo tener una afectación más grave ya que se trabaja en AGP con vidrio y maquinaria y el uso de EPPs es esencial para desarrollar las labores en AGP?",
+    "¿Conoce el Reglamento Interno de Trabajo?",
+    "¿Considera que cometió una falta?",
+    "¿Quiere agregar algo más a la presente?",
+)
+
+_PREGUNTAS_CELULAR = (
+    "¿Cuánto tiempo lleva en la compañía y en el cargo?",
+    "¿Confirme o niegue si tenía permiso para utilizar el celular en el área de trabajo?",
+    "¿En ocasiones anteriores ha hecho uso del celular en su puesto de trabajo?",
+    "¿Usted conoce la política de celulares estipulada por la compañía?",
+    "De acuerdo con la política de celulares, si existe alguna urgencia usted debe solicitar permiso a su jefe inmediato para utilizar el celular, ¿usted solicitó o informó a su jefe inmediato sobre el uso de su celular?",
+    "¿Usted es consciente que utilizar el celular en el área de trabajo es un riesgo físico para usted y sus compañeros?",
+    "¿Conoce el Reglamento Interno de Trabajo?",
+    "¿Considera que cometió una falta?",
+    "¿Quiere agregar algo más a la presente diligencia?",
+)
+
+_PREGUNTAS_RETARDO = (
+    "¿Cuánto tiempo lleva en la compañía y en el cargo?",
+    "¿Confirma usted que se presentó con un retardo en su hora de llegada de xxxx minutos el día xxxx?",
+    "¿Tenía usted permiso para presentarse con un retardo de xxxx minutos el día xxxx?",
+    "¿Tiene algún soporte que justifique el retraso de xxxx minutos en su hora de llegada el día xxxx?",
+    "¿Sabe usted que presentarse con un retraso puede ser considerado una falta grave?",
+    "¿Sabe usted que está prohibido presentarse al puesto de trabajo con un retardo de hasta xxx minutos después de iniciada la jornada laboral?",
+    "¿Conoce el Reglamento Interno de Trabajo?",
+    "¿Considera que cometió una falta?",
+    "¿Quiere agregar algo más a la presente?",
+)
+
+_PREGUNTAS_DANO = (
+    "¿Cuánto tiempo lleva en la compañía y en el cargo?",
+    "¿Puede explicar cómo ocurrió el daño del equipo o herramienta?",
+    "¿Estaba siguiendo el procedimiento adecuado al momento del daño?",
+    "¿Había reportado algún desperfecto o falla previa?",
+    "¿Sabe que debe cuidar y utilizar adecuadamente las herramientas e instalaciones de la empresa?",
+    "¿Conoce el Reglamento Interno de Trabajo?",
+    "¿Considera que cometió una falta?",
+    "¿Quiere agregar algo más a la presente diligencia?",
+)
+
+_PREGUNTAS_OTROS = (
+    "¿Cuánto tiempo lleva en la compañía y en el cargo?",
+    "Describa brevemente los hechos que dieron lugar a esta diligencia.",
+    "¿Tenía conocimiento de las normas aplicables a esta situación?",
+    "¿Conoce el Reglamento Interno de Trabajo?",
+    "¿Considera que cometió una falta?",
+    "¿Quiere agregar algo más a la presente diligencia?",
+)
+
+# Palabra clave del tipo de falta -> preguntas (se evalúan en este orden)
+_PREGUNTAS_BASE = {
+    "procedimiento": _PREGUNTAS_PROCEDIMIENTO,
+    "ausencia": _PREGUNTAS_AUSENCIA,
+    "epp": _PREGUNTAS_EPP,
+    "protección": _PREGUNTAS_EPP,
+    "celular": _PREGUNTAS_CELULAR,
+    "retardo": _PREGUNTAS_RETARDO,
+    "tardanza": _PREGUNTAS_RETARDO,
+    "daño": _PREGUNTAS_DANO,
+    "herramienta": _PREGUNTAS_DANO,
+    "equipo": _PREGUNTAS_DANO,
+}
+
+
 def preguntas_base_por_tipo(tipo: str) -> list:
     """Devuelve las preguntas base según el tipo de falta detectado."""
     tipo = tipo.strip().lower()
-    if "procedimiento" in tipo:
-        return [
-            "¿Cuánto tiempo lleva en la compañía y en el cargo?",
-            "¿Sabe usted que debe actuar con diligencia y cuidado para asegurar la calidad y eficiencia en su trabajo, según el artículo 54 del Reglamento Interno?",
-            "¿Conoce el Reglamento Interno de Trabajo?",
-            "¿Considera que cometió una falta?",
-            "¿Quiere agregar algo más a la presente diligencia?"
-        ]
-    elif "ausencia" in tipo:
-        return [
-            "¿Cuánto tiempo lleva en la compañía y en el cargo?",
-            "¿Por qué no asistió a trabajar los días mencionados?",
-            "¿Tiene algún soporte que justifique sus ausencias?",
-            "¿Sabe usted que se les prohíbe a los trabajadores faltar al turno o jornada de trabajo sin justa causa de impedimento o sin permiso de la Empresa?",
-            "¿Sabe usted que es una falta grave la falta parcial o total en la jornada de la mañana o de la tarde para el personal administrativo, o en el turno correspondiente para el personal operativo, sin excusa suficiente?",
-            "¿Conoce el Reglamento Interno de Trabajo?",
-            "¿Considera que cometió una falta?",
-            "¿Quiere agregar algo más a la presente?"
-        ]
-    elif "epp" in tipo or "protección" in tipo:
-        return [
-            "¿Cuánto tiempo lleva en la compañía y en el cargo?",
-            "¿Usted se encontraba haciendo caso omiso del uso de EPPS?",
-            "¿Por qué motivo no estaba usando los EPPS?",
-            "¿Sabe usted que es prohibido “Hacer caso omiso en el uso de los elementos de protección personal y ejecutar cualquier acto inseguro que ponga en peligro su seguridad”?",
-            "¿Usted es consciente que pudo tener una afectación más grave ya que se trabaja en AGP con vidrio y maquinaria y el uso de EPPs es esencial para desarrollar las labores en AGP?",
-            "¿Conoce el Reglamento Interno de Trabajo?",
-            "¿Considera que cometió una falta?",
-            "¿Quiere agregar algo más a la presente?"
-        ]
-    elif "celular" in tipo:
-        return [
-            "¿Cuánto tiempo lleva en la compañía y en el cargo?",
-            "¿Confirme o niegue si tenía permiso para utilizar el celular en el área de trabajo?",
-            "¿En ocasiones anteriores ha hecho uso del celular en su puesto de trabajo?",
-            "¿Usted conoce la política de celulares estipulada por la compañía?",
-            "De acuerdo con la política de celulares, si existe alguna urgencia usted debe solicitar permiso a su jefe inmediato para utilizar el celular, ¿usted solicitó o informó a su jefe inmediato sobre el uso de su celular?",
-            "¿Usted es consciente que utilizar el celular en el área de trabajo es un riesgo físico para usted y sus compañeros?",
-            "¿Conoce el Reglamento Interno de Trabajo?",
-            "¿Considera que cometió una falta?",
-            "¿Quiere agregar algo más a la presente diligencia?"
-        ]
-    elif "retardo" in tipo or "tardanza" in tipo:
-        return [
-            "¿Cuánto tiempo lleva en la compañía y en el cargo?",
-            "¿Confirma usted que se presentó con un retardo en su hora de llegada de xxxx minutos el día xxxx?",
-            "¿Tenía usted permiso para presentarse con un retardo de xxxx minutos el día xxxx?",
-            "¿Tiene algún soporte que justifique el retraso de xxxx minutos en su hora de llegada el día xxxx?",
-            "¿Sabe usted que presentarse con un retraso puede ser considerado una falta grave?",
-            "¿Sabe usted que está prohibido presentarse al puesto de trabajo con un retardo de hasta xxx minutos después de iniciada la jornada laboral?",
-            "¿Conoce el Reglamento Interno de Trabajo?",
-            "¿Considera que cometió una falta?",
-            "¿Quiere agregar algo más a la presente?"
-        ]
-    elif "daño" in tipo or "herramienta" in tipo or "equipo" in tipo:
-        return [
-            "¿Cuánto tiempo lleva en la compañía y en el cargo?",
-            "¿Puede explicar cómo ocurrió el daño del equipo o herramienta?",
-            "¿Estaba siguiendo el procedimiento adecuado al momento del daño?",
-            "¿Había reportado algún desperfecto o falla previa?",
-            "¿Sabe que debe cuidar y utilizar adecuadamente las herramientas e instalaciones de la empresa?",
-            "¿Conoce el Reglamento Interno de Trabajo?"
-            "¿Considera que cometió una falta?",
-            "¿Quiere agregar algo más a la presente diligencia?"
-        ]
-    else:  # Caso "otros"
-        return [
-            "¿Cuánto tiempo lleva en la compañía y en el cargo?",
-            "Describa brevemente los hechos que dieron lugar a esta diligencia.",
-            "¿Tenía conocimiento de las normas aplicables a esta situación?",
-            "¿Conoce el Reglamento Interno de Trabajo?",
-            "¿Considera que cometió una falta?",
-            "¿Quiere agregar algo más a la presente diligencia?"
-        ]
+    for clave, preguntas in _PREGUNTAS_BASE.items():
+        if clave in tipo:
+            return list(preguntas)
+    return list(_PREGUNTAS_OTROS)  # Caso "otros"
 
 # === ORGANIZAR PREGUNTAS ===
 import unicodedata
@@ -310,12 +403,27 @@ def organizar_preguntas(preguntas_base: list, preguntas_ia: list) -> list:
 
 
 # === GENERAR PREGUNTAS (actualizado) ===
-def generar_preguntas_gemini(parsed: dict, max_ai=5):
-    """Genera preguntas combinando base + 5 IA (más robusto)."""
-    base = preguntas_base_por_tipo(parsed.get("tipo_falta", "otros"))
-
+def _lineas_completas(stream, partes: list):
+    """Agrupa los fragmentos del stream en bloques de líneas ya terminadas (el último, al cerrar)."""
+    pendiente = ""
+    for chunk in stream:
+        partes.append(chunk.text)
+        completas, _, pendiente = (pendiente + chunk.text).rpartition("\n")
+        if completas:
+            yield completas
+    yield pendiente
+
+
+def generar_preguntas_ia_stream(parsed: dict, max_ai=5):
+    """Entrega las preguntas de IA una a una, a medida que Gemini termina de escribir cada línea."""
     if not API_KEY:
-        return base
+        return
+
+    clave = _clave_cache_gemini(parsed, max_ai)
+    ai_qs = _CACHE_GEMINI.get(clave)
+    if ai_qs is not None:
+        yield from ai_qs
+        return
 
     prompt = f"""
 Eres un asistente de Recursos Humanos especializado en diligencias de descargo laborales.
@@ -337,47 +445,99 @@ Ejemplo de formato esperado:
 5. ¿Pregunta 5?
 """
 
+    ai_qs = []
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        res = model.generate_content(prompt)
-
-        raw_text = res.text.strip()
+        partes = []
+        stream = _generar_contenido(prompt)
+
+        # Aceptar numeradas o con guiones, apenas se completa cada línea
+        for bloque in _lineas_completas(stream, partes):
+            for linea in _RE_NUMLINE.findall(bloque):
+                # Una línea con varias preguntas seguidas se separa por signos de interrogación
+                preguntas = _RE_PREGUNTA.findall(linea) if linea.count("¿") > 1 else [linea]
+                for q in preguntas:
+                    if len(q) > 10 and q.endswith("?") and len(ai_qs) < max_ai:
+                        ai_qs.append(q)
+                        yield q
+
+        raw_text = "".join(partes).strip()
         print("\n=== Respuesta cruda de Gemini ===\n", raw_text, "\n========================\n")
 
-        # Aceptar numeradas, con guiones o en texto corrido
-        lines = re.split(r"[\n•\-]\s*", raw_text)
-        ai_qs = [re.sub(r"^\d+\.\s*", "", l).strip() for l in lines if len(l.strip()) > 10]
-
         # Si el modelo devolvió un párrafo largo, intenta dividir por signos de interrogación
         if len(ai_qs) < 3:
-            ai_qs = re.findall(r"¿[^?]+\?", raw_text)
+            for q in _RE_PREGUNTA.findall(raw_text):
+                q = q.strip()
+                if q not in ai_qs and len(ai_qs) < max_ai:
+                    ai_qs.append(q)
+                    yield q
 
-        ai_qs = [q.strip() for q in ai_qs if q.endswith("?")][:max_ai]
+    except Exception as e:
+        print("⚠️ Error con Gemini:", e)
+        return
 
-        if not ai_qs:
-            ai_qs = ["(La IA no generó preguntas adicionales correctamente.)"]
+    if ai_qs:
+        _CACHE_GEMINI.set(clave, ai_qs)
+    else:
+        yield "(La IA no generó preguntas adicionales correctamente.)"
 
-        return organizar_preguntas(base, ai_qs)
 
-    except Exception as e:
-        print("⚠️ Error con Gemini:", e)
-        return organizar_preguntas(base, []) 
+def combinar_preguntas(parsed: dict, preguntas_ia: list) -> list:
+    """Ordena las preguntas base del tipo de falta junto con las generadas por IA."""
+    base = preguntas_base_por_tipo(parsed.get("tipo_falta", "otros"))
+
+    if not API_KEY:
+        return base
+
+    return organizar_preguntas(base, preguntas_ia)
+
+
+def generar_preguntas_gemini(parsed: dict, max_ai=5):
+    """Genera preguntas combinando base + 5 IA (más robusto)."""
+    return combinar_preguntas(parsed, list(generar_preguntas_ia_stream(parsed, max_ai)))
 
 # === GENERAR ACTA WORD ===
-def generar_acta(parsed: dict, preguntas: list):
-    """Llena la plantilla de acta Word con los datos de la citación."""
+# Hilos dedicados a escribir los .docx, para no bloquear el render del acta siguiente
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+
+def _guardar_acta(doc: DocxTemplate, salida: Path) -> Path:
+    # Se escribe en un temporal y se renombra: dos guardados simultáneos de la misma ruta
+    # (dos sesiones de Streamlit, por ejemplo) nunca mezclan sus bytes, el último simplemente gana
+    fd, temporal = tempfile.mkstemp(dir=salida.parent, suffix=".docx.tmp")
+    os.close(fd)
+    try:
+        doc.save(temporal)
+        os.replace(temporal, salida)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    print(f"✅ Acta generada: {salida}")
+    return salida
+
+
+def generar_acta(parsed: dict, preguntas: list, sufijo: str = "") -> Future:
+    """
+    Llena la plantilla de acta Word con los datos de la citación.
+    El archivo se nombra con el nombre y la cédula; `sufijo` distingue varias actas del mismo trabajador.
+    El guardado se hace en segundo plano: devuelve un Future cuyo resultado es la ruta del acta.
+    """
+    # render() modifica el XML: se trabaja sobre una copia del documento ya parseado
+    # (DocxTemplate no lee la ruta al construirse, y tras render() tampoco al guardar)
     doc = DocxTemplate(str(PLANTILLA_ACTA))
+    doc.docx = copy.deepcopy(_plantilla().docx)
 
     # Construir el bloque de preguntas con formato
-    bloque_preguntas = ""
-    for i, p in enumerate(preguntas, start=1):
-        bloque_preguntas += (
-            f"PREGUNTA:\n{i}. {p}\n"
-            f"RESPUESTA:\n\n\n"
-        )
+    bloque_preguntas = "".join(
+        f"PREGUNTA:\n{i}. {p}\n"
+        f"RESPUESTA:\n\n\n"
+        for i, p in enumerate(preguntas, start=1)
+    )
+
+    # El nombre llega en mayúsculas tal como está en la citación
+    nombre = parsed["nombre"].title()
 
     contexto = {
-        "nombre": parsed["nombre"],
+        "nombre": nombre,
         "cedula": parsed["cedula"],
         "fecha_citacion": parsed["fecha_citacion"],
         "fecha_hecho": parsed["fecha_hecho"],
@@ -388,34 +548,64 @@ def generar_acta(parsed: dict, preguntas: list):
     }
 
     ACTAS_DIR.mkdir(exist_ok=True)
-    salida = ACTAS_DIR / f"Acta_{parsed['nombre'].replace(' ', '_')}.docx"
+    nombre_archivo = f"Acta_{nombre}_{parsed['cedula']}{sufijo}".replace(" ", "_")
+    salida = ACTAS_DIR / f"{nombre_archivo}.docx"
     doc.render(contexto)
-    doc.save(salida)
-    print(f"✅ Acta generada: {salida}")
-    return salida
+    return _IO_EXECUTOR.submit(_guardar_acta, doc, salida)
 
 # === MAIN ===
-def main():
-    archivos = [f for f in CITACIONES_DIR.glob("*.pdf")]
-    if not archivos:
-        print("No hay PDFs en la carpeta 'Citaciones/'.")
-        return
+GEMINI_MAX_WORKERS = 10
+
 
-    archivo = archivos[0]
+def _parse_one(archivo: Path):
+    """Lee y extrae los datos de una citación (devuelve None si el PDF no tiene texto)."""
     print(f"Procesando citación: {archivo.name}")
 
     texto = leer_texto_pdf(archivo)
     if len(texto) < 50:
-        print("⚠️ No se extrajo texto suficiente. Verifica que el PDF no esté escaneado como imagen.")
-        return
+        print(f"⚠️ No se extrajo texto suficiente de {archivo.name}. Verifica que el PDF no esté escaneado como imagen.")
+        return None
 
     print("✅ Texto extraído correctamente.")
     datos = extraer_datos_citacion(texto)
     print("📋 Datos extraídos:", datos)
+    return datos
 
+
+def _generar_acta_completa(datos: dict, sufijo: str = "") -> Future:
+    """Genera las preguntas con Gemini y llena el acta de una citación."""
     preguntas = generar_preguntas_gemini(datos)
+    return generar_acta(datos, preguntas, sufijo)
+
+
+def _sufijos_unicos(datos_list: list) -> list:
+    """Sufijo por citación para que dos actas con el mismo nombre y cédula no se pisen ("", "_2", "_3"...)."""
+    repeticiones = Counter()
+    sufijos = []
+    for datos in datos_list:
+        clave = (datos["nombre"], datos["cedula"])
+        repeticiones[clave] += 1
+        sufijos.append(f"_{repeticiones[clave]}" if repeticiones[clave] > 1 else "")
+    return sufijos
+
+
+def main():
+    archivos = sorted(CITACIONES_DIR.glob("*.pdf"))
+    if not archivos:
+        print("No hay PDFs en la carpeta 'Citaciones/'.")
+        return
+
+    # Leer PDFs y aplicar regex es trabajo de CPU: un proceso por núcleo
+    with ProcessPoolExecutor() as executor:
+        datos_list = [datos for datos in executor.map(_parse_one, archivos) if datos]
+
+    # Gemini y el guardado del Word son esperas de red/disco: basta con hilos
+    with ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS) as executor:
+        futuros = list(executor.map(_generar_acta_completa, datos_list, _sufijos_unicos(datos_list)))
 
-    generar_acta(datos, preguntas)
+    # Esperar a que terminen de escribirse todas las actas (y propagar errores de guardado)
+    for futuro in futuros:
+        futuro.result()
 
 
 